@@ -7,8 +7,8 @@ different components of the system.
 
 # Import the individual communication components
 from .message_broker import MessageBroker
-from .rest_client import RestClient
-from .rest_server import RestServer
+from .rest_client import BatchCall, RestClient
+from .rest_server import ORJSONRoute, RestServer
 
 # Export the classes for backward compatibility
-__all__ = ["MessageBroker", "RestClient", "RestServer"]
+__all__ = ["MessageBroker", "RestClient", "RestServer", "BatchCall", "ORJSONRoute"]
@@ -6,15 +6,124 @@ and sensitive information like API keys and passwords.
 """
 
 import os
-import json
 import base64
+import hashlib
+import json
+import re
 import threading
-from typing import Any, Dict, List, Optional, Set, Union
+from typing import Any, Callable, Container, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import orjson
 from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+try:
+    from fastrlock.rlock import FastRLock as RLock
+except ImportError:
+    from threading import RLock
+
 from .logging import setup_logging
 
+# Layout of the secrets file: version byte, salt, nonce, AES-GCM ciphertext
+_SECRETS_VERSION = b'\x01'
+_SALT_SIZE = 16
+_NONCE_SIZE = 12
+_HEADER_SIZE = 1 + _SALT_SIZE + _NONCE_SIZE
+
+# Salt used by secrets files written with Fernet before the versioned format
+_LEGACY_SALT = b'cerebritron_salt'
+
+# Keys derived from master passwords, keyed by a hash of password and salt
+_KDF_CACHE: Dict[bytes, bytes] = {}
+_KDF_LOCK = threading.Lock()
+
+# Marker for keys missing from the configuration
+_MISSING = object()
+
+# Run of digits that may be an integer outside the 64-bit range, which orjson
+# would turn into a float
+_LONG_NUMBER = re.compile(rb"\d{19}")
+
+
+def _copy_dicts(value: Any) -> Any:
+    """Copy the nested dicts of a configuration value.
+    
+    The flat index refers to every nested dict, so the configuration must not
+    share them with callers who might change them.
+    
+    Args:
+        value: Value to copy
+        
+    Returns:
+        Value with all nested dicts copied
+    """
+    if isinstance(value, dict):
+        return {key: _copy_dicts(item) for key, item in value.items()}
+    
+    return value
+
+
+def _flatten(prefix: str, node: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """Walk all dotted keys of a nested dict.
+    
+    Args:
+        prefix: Prefix of the keys, empty or ending with a dot
+        node: Dict to walk
+        
+    Returns:
+        Iterator over pairs of dotted key and value
+    """
+    pending = [(prefix, node)]
+    while pending:
+        prefix, node = pending.pop()
+        for part, value in node.items():
+            key = f"{prefix}{part}"
+            yield key, value
+            if isinstance(value, dict):
+                pending.append((f"{key}.", value))
+
+
+def _dumps(value: Any, indent: bool = False) -> bytes:
+    """Serialize a value to JSON.
+    
+    Values orjson rejects, like integers outside the 64-bit range, are
+    serialized with the stdlib instead. orjson writes NaN and infinities as
+    null.
+    
+    Args:
+        value: Value to serialize
+        indent: Indent nested values by two spaces
+        
+    Returns:
+        JSON document
+    """
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+    try:
+        return orjson.dumps(value, option=option)
+    except orjson.JSONEncodeError:
+        return json.dumps(value, indent=2 if indent else None).encode()
+
+
+def _loads(data: bytes) -> Any:
+    """Parse a JSON document.
+    
+    Documents that may hold integers orjson can't represent exactly, or that
+    orjson rejects, like ones with NaN, are parsed with the stdlib instead.
+    
+    Args:
+        data: JSON document
+        
+    Returns:
+        Parsed value
+    """
+    if not _LONG_NUMBER.search(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    
+    return json.loads(data)
+
 
 class ConfigurationManager:
     """Manages configuration and secrets for the system."""
@@ -31,9 +140,18 @@ class ConfigurationManager:
         self._config_file = os.path.join(self._config_dir, "config.json")
         self._secrets_file = os.path.join(self._config_dir, "secrets.enc")
         self._config = {}
+        self._flat_config = {}
         self._secrets = {}
-        self._key = None
-        self._lock = threading.RLock()
+        self._salt = None
+        self._aead = None
+        self._config_dirty = False
+        self._secrets_dirty = False
+        self._flush_interval = 0.5
+        self._flush_event = threading.Event()
+        self._stop_flush = threading.Event()
+        self._flush_thread = None
+        self._lock = RLock()
+        self._io_lock = threading.Lock()
         self._initialized = False
         self._logger = setup_logging(__name__)
     
@@ -53,20 +171,26 @@ class ConfigurationManager:
                 # Create config directory if it doesn't exist
                 os.makedirs(self._config_dir, exist_ok=True)
                 
-                # Generate encryption key from master password
-                self._generate_key()
-                
                 # Load configuration
                 self._load_config()
                 
-                # Load secrets
+                # Load secrets and generate encryption key from master password
                 self._load_secrets()
                 
+                # Start flush thread
+                self._stop_flush.clear()
+                self._flush_thread = threading.Thread(
+                    target=self._flush_loop,
+                    daemon=True,
+                    name="config-flush"
+                )
+                self._flush_thread.start()
+                
                 self._initialized = True
                 self._logger.info("Configuration manager initialized successfully")
                 return True
             except Exception as e:
-                self._logger.error(f"Error initializing configuration manager: {e}")
+                self._logger.error("Error initializing configuration manager: %s", e)
                 return False
     
     def shutdown(self) -> bool:
@@ -75,6 +199,13 @@ class ConfigurationManager:
         Returns:
             True if shutdown was successful, False otherwise
         """
+        # Stop flush thread before taking the lock, since flushing needs it
+        self._stop_flush.set()
+        self._flush_event.set()
+        if self._flush_thread:
+            self._flush_thread.join(timeout=5.0)
+            self._flush_thread = None
+        
         with self._lock:
             if not self._initialized:
                 return True
@@ -92,7 +223,7 @@ class ConfigurationManager:
                 self._logger.info("Configuration manager shutdown successfully")
                 return True
             except Exception as e:
-                self._logger.error(f"Error shutting down configuration manager: {e}")
+                self._logger.error("Error shutting down configuration manager: %s", e)
                 return False
     
     def get_config(self, key: str, default: Any = None) -> Any:
@@ -105,19 +236,18 @@ class ConfigurationManager:
         Returns:
             Configuration value if found, default otherwise
         """
-        with self._lock:
-            # Split key into parts
-            parts = key.split(".")
-            
-            # Navigate through config
-            current = self._config
-            for part in parts[:-1]:
-                if part not in current or not isinstance(current[part], dict):
-                    return default
-                current = current[part]
-            
-            # Get value
-            return current.get(parts[-1], default)
+        # Changes add the new index entries before dropping stale ones, so a
+        # key present before and after a change can be read without the lock
+        value = self._flat_config.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        
+        # Hand out a copy, changes to it must go through set_config()
+        if isinstance(value, dict):
+            with self._lock:
+                return _copy_dicts(value)
+        
+        return value
     
     def set_config(self, key: str, value: Any) -> bool:
         """Set a configuration value.
@@ -131,27 +261,41 @@ class ConfigurationManager:
         """
         with self._lock:
             try:
+                # Reject values that could never be saved
+                _dumps(value)
+                
                 # Split key into parts
                 parts = key.split(".")
                 
                 # Navigate through config
                 current = self._config
-                for part in parts[:-1]:
+                for i, part in enumerate(parts[:-1]):
                     if part not in current:
                         current[part] = {}
+                        self._flat_config[".".join(parts[:i + 1])] = current[part]
                     elif not isinstance(current[part], dict):
                         current[part] = {}
+                        self._flat_config[".".join(parts[:i + 1])] = current[part]
                     current = current[part]
                 
-                # Set value
+                # Set value, keeping a copy so later changes by the caller don't
+                # bypass the index
+                value = _copy_dicts(value)
+                previous = current.get(parts[-1])
                 current[parts[-1]] = value
+                entries = {key: value}
+                if isinstance(value, dict):
+                    entries.update(_flatten(f"{key}.", value))
+                self._flat_config.update(entries)
+                self._unindex_config(key, previous, entries)
                 
-                # Save configuration
-                self._save_config()
+                # Schedule save
+                self._config_dirty = True
+                self._schedule_save(self._save_config)
                 
                 return True
             except Exception as e:
-                self._logger.error(f"Error setting configuration: {e}")
+                self._logger.error("Error setting configuration: %s", e)
                 return False
     
     def get_secret(self, key: str) -> Optional[str]:
@@ -178,15 +322,19 @@ class ConfigurationManager:
         """
         with self._lock:
             try:
+                # Reject values that could never be saved
+                _dumps(value)
+                
                 # Set value
                 self._secrets[key] = value
                 
-                # Save secrets
-                self._save_secrets()
+                # Schedule save
+                self._secrets_dirty = True
+                self._schedule_save(self._save_secrets)
                 
                 return True
             except Exception as e:
-                self._logger.error(f"Error setting secret: {e}")
+                self._logger.error("Error setting secret: %s", e)
                 return False
     
     def delete_config(self, key: str) -> bool:
@@ -212,14 +360,16 @@ class ConfigurationManager:
                 
                 # Delete value
                 if parts[-1] in current:
-                    del current[parts[-1]]
+                    self._unindex_config(key, current.pop(parts[-1]))
+                    del self._flat_config[key]
                 
-                # Save configuration
-                self._save_config()
+                # Schedule save
+                self._config_dirty = True
+                self._schedule_save(self._save_config)
                 
                 return True
             except Exception as e:
-                self._logger.error(f"Error deleting configuration: {e}")
+                self._logger.error("Error deleting configuration: %s", e)
                 return False
     
     def delete_secret(self, key: str) -> bool:
@@ -237,45 +387,63 @@ class ConfigurationManager:
                 if key in self._secrets:
                     del self._secrets[key]
                 
-                # Save secrets
-                self._save_secrets()
+                # Schedule save
+                self._secrets_dirty = True
+                self._schedule_save(self._save_secrets)
                 
                 return True
             except Exception as e:
-                self._logger.error(f"Error deleting secret: {e}")
+                self._logger.error("Error deleting secret: %s", e)
                 return False
     
-    def _generate_key(self) -> None:
-        """Generate encryption key from master password."""
+    def _generate_key(self, salt: bytes) -> None:
+        """Generate encryption key from master password.
+        
+        Args:
+            salt: Salt for key derivation
+        """
         try:
-            # Generate salt
-            salt = b'cerebritron_salt'
-            
-            # Generate key
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=100000
-            )
-            
-            # Derive key from password
-            key = base64.urlsafe_b64encode(kdf.derive(self._master_password.encode()))
-            
-            # Create Fernet cipher
-            self._key = Fernet(key)
+            # Create AES-GCM cipher
+            self._aead = AESGCM(self._derive_key(salt))
+            self._salt = salt
         except Exception as e:
-            self._logger.error(f"Error generating encryption key: {e}")
+            self._logger.error("Error generating encryption key: %s", e)
             raise
     
+    def _derive_key(self, salt: bytes) -> bytes:
+        """Derive a raw 32-byte key from the master password.
+        
+        Args:
+            salt: Salt for key derivation
+            
+        Returns:
+            Derived key
+        """
+        # Reuse the key if it was already derived in this process
+        cache_key = hashlib.sha256(self._master_password.encode() + salt).digest()
+        with _KDF_LOCK:
+            derived_key = _KDF_CACHE.get(cache_key)
+            if derived_key is None:
+                # Derive key from password with PBKDF2-HMAC-SHA256
+                derived_key = hashlib.pbkdf2_hmac(
+                    'sha256',
+                    self._master_password.encode(),
+                    salt,
+                    100000,
+                    32
+                )
+                _KDF_CACHE[cache_key] = derived_key
+        
+        return derived_key
+    
     def _load_config(self) -> None:
         """Load configuration from file."""
         try:
             # Check if config file exists
             if os.path.exists(self._config_file):
                 # Load config
-                with open(self._config_file, "r") as f:
-                    self._config = json.load(f)
+                with open(self._config_file, "rb") as f:
+                    self._config = _loads(f.read())
             else:
                 # Create empty config
                 self._config = {}
@@ -283,18 +451,56 @@ class ConfigurationManager:
                 # Save config
                 self._save_config()
         except Exception as e:
-            self._logger.error(f"Error loading configuration: {e}")
+            self._logger.error("Error loading configuration: %s", e)
             # Create empty config
             self._config = {}
+        
+        self._index_config()
+    
+    def _index_config(self) -> None:
+        """Rebuild the flat index of configuration values.
+        
+        Every dotted key, including keys of nested dicts, maps directly to
+        its value, so lookups do not have to walk the nested config. Changes
+        update only the entries below the changed key.
+        """
+        self._flat_config = dict(_flatten("", self._config))
+    
+    def _unindex_config(self, key: str, value: Any, keep: Container[str] = ()) -> None:
+        """Remove the index entries of the keys nested below a key.
+        
+        Must be called with the lock held.
+        
+        Args:
+            key: Key whose value is replaced or deleted
+            value: Previous value of the key
+            keep: Nested keys that are still present after the change
+        """
+        if isinstance(value, dict):
+            for nested_key, _ in _flatten(f"{key}.", value):
+                if nested_key not in keep:
+                    self._flat_config.pop(nested_key, None)
     
     def _save_config(self) -> None:
         """Save configuration to file."""
         try:
-            # Save config
-            with open(self._config_file, "w") as f:
-                json.dump(self._config, f, indent=2)
+            with self._lock:
+                # Convert config to JSON
+                data = _dumps(self._config, indent=True)
+                self._config_dirty = False
+                
+                # Take the write lock before releasing the state lock, so
+                # snapshots reach the disk in the order they were taken
+                self._io_lock.acquire()
+            
+            try:
+                # Save config
+                self._write_file(self._config_file, data)
+            finally:
+                self._io_lock.release()
         except Exception as e:
-            self._logger.error(f"Error saving configuration: {e}")
+            self._config_dirty = True
+            self._logger.error("Error saving configuration: %s", e)
             raise
     
     def _load_secrets(self) -> None:
@@ -306,34 +512,128 @@ class ConfigurationManager:
                 with open(self._secrets_file, "rb") as f:
                     encrypted_data = f.read()
                 
-                # Decrypt secrets
-                decrypted_data = self._key.decrypt(encrypted_data)
-                
-                # Parse secrets
-                self._secrets = json.loads(decrypted_data.decode())
+                if encrypted_data[:1] == _SECRETS_VERSION:
+                    # Generate key from the salt stored in the file
+                    self._generate_key(encrypted_data[1:1 + _SALT_SIZE])
+                    
+                    # Decrypt secrets
+                    nonce = encrypted_data[1 + _SALT_SIZE:_HEADER_SIZE]
+                    decrypted_data = self._aead.decrypt(nonce, encrypted_data[_HEADER_SIZE:], None)
+                    
+                    # Parse secrets
+                    self._secrets = _loads(decrypted_data)
+                else:
+                    # Decrypt secrets written with Fernet and the fixed salt
+                    legacy_key = base64.urlsafe_b64encode(self._derive_key(_LEGACY_SALT))
+                    decrypted_data = Fernet(legacy_key).decrypt(encrypted_data)
+                    
+                    # Parse secrets
+                    self._secrets = _loads(decrypted_data)
+                    
+                    # Re-encrypt secrets in the current format
+                    self._generate_key(os.urandom(_SALT_SIZE))
+                    self._save_secrets()
             else:
+                # Generate key with a new salt
+                self._generate_key(os.urandom(_SALT_SIZE))
+                
                 # Create empty secrets
                 self._secrets = {}
                 
                 # Save secrets
                 self._save_secrets()
         except Exception as e:
-            self._logger.error(f"Error loading secrets: {e}")
+            self._logger.error("Error loading secrets: %s", e)
             # Create empty secrets
             self._secrets = {}
+            
+            # Make sure secrets can still be saved
+            if self._aead is None:
+                self._generate_key(os.urandom(_SALT_SIZE))
     
     def _save_secrets(self) -> None:
         """Save secrets to file."""
         try:
-            # Convert secrets to JSON
-            data = json.dumps(self._secrets).encode()
-            
-            # Encrypt secrets
-            encrypted_data = self._key.encrypt(data)
+            with self._lock:
+                # The key is derived when the secrets are loaded
+                if self._aead is None:
+                    raise RuntimeError("encryption key not loaded, call initialize() first")
+                
+                # Convert secrets to JSON
+                data = _dumps(self._secrets)
+                self._secrets_dirty = False
+                
+                # Take the write lock before releasing the state lock, so
+                # snapshots reach the disk in the order they were taken
+                self._io_lock.acquire()
             
-            # Save secrets
-            with open(self._secrets_file, "wb") as f:
-                f.write(encrypted_data)
+            try:
+                # Encrypt secrets
+                nonce = os.urandom(_NONCE_SIZE)
+                encrypted_data = _SECRETS_VERSION + self._salt + nonce + self._aead.encrypt(nonce, data, None)
+                
+                # Save secrets
+                self._write_file(self._secrets_file, encrypted_data)
+            finally:
+                self._io_lock.release()
         except Exception as e:
-            self._logger.error(f"Error saving secrets: {e}")
+            self._secrets_dirty = True
+            self._logger.error("Error saving secrets: %s", e)
+            raise
+    
+    def _schedule_save(self, save: Callable[[], None]) -> None:
+        """Have the flush thread save a change, or save it right away.
+        
+        Before initialize() and after shutdown() no flush thread is running,
+        so changes are saved before returning, as errors can then still be
+        reported to the caller. Must be called with the lock held.
+        
+        Args:
+            save: Function saving the changed file
+        """
+        if self._flush_thread is None:
+            save()
+        else:
+            self._flush_event.set()
+    
+    def _write_file(self, path: str, data: bytes) -> None:
+        """Atomically replace a file with new contents.
+        
+        The contents are synced to disk before the file is replaced, so a
+        crash leaves either the old or the new file, never a truncated one.
+        
+        Args:
+            path: Path of the file to replace
+            data: Contents to write
+        """
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            # Do not leave a partial file behind
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             raise
+    
+    def _flush_loop(self) -> None:
+        """Write pending changes to disk."""
+        while not self._stop_flush.is_set():
+            # Wait for a change
+            self._flush_event.wait()
+            
+            # Let further changes accumulate so they are written together
+            self._stop_flush.wait(self._flush_interval)
+            self._flush_event.clear()
+            
+            try:
+                if self._config_dirty:
+                    self._save_config()
+                
+                if self._secrets_dirty:
+                    self._save_secrets()
+            except Exception as e:
+                self._logger.error("Error flushing configuration: %s", e)
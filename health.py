@@ -8,11 +8,84 @@ import os
 import time
 import threading
 import json
-from typing import Dict, Any, Optional, List, Callable
+from concurrent.futures import ThreadPoolExecutor, wait
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, Callable, Mapping
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from fastrlock.rlock import FastRLock as RLock
+except ImportError:
+    from threading import RLock
 
 from .logging import setup_logging
 
+# Timeout for a single dependency health check in seconds
+_CHECK_TIMEOUT = 5.0
+
+# Shared by all health checks so dependencies are checked concurrently
+# over pooled connections
+_HTTP_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="health-check")
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount("http://", HTTPAdapter(pool_maxsize=16))
+_HTTP_SESSION.mount("https://", HTTPAdapter(pool_maxsize=16))
+
+
+def to_dict(health: Mapping[str, Any]) -> Dict[str, Any]:
+    """Convert health status data to plain dicts.
+    
+    Health snapshots are nested read-only mappings, which json and orjson
+    can't serialize. Convert them first.
+    
+    Args:
+        health: Health status data from check_health() or get_health()
+        
+    Returns:
+        Mutable copy of the health status data
+    """
+    return {
+        key: to_dict(value) if isinstance(value, Mapping) else value
+        for key, value in health.items()
+    }
+
+
+def _check_dependency(url: str) -> Dict[str, Any]:
+    """Check health of a dependency.
+    
+    Args:
+        url: URL of the dependency
+        
+    Returns:
+        Dependency health data
+    """
+    try:
+        # Make health check request
+        response = _HTTP_SESSION.get(f"{url}/health", timeout=_CHECK_TIMEOUT)
+        
+        # Parse response
+        if response.status_code == 200:
+            health_data = response.json()
+            
+            return {
+                "status": health_data.get("status", "unknown"),
+                "timestamp": time.time()
+            }
+        else:
+            # Dependency is unhealthy
+            return {
+                "status": "unhealthy",
+                "error": f"Health check failed with status code {response.status_code}",
+                "timestamp": time.time()
+            }
+    except Exception as e:
+        # Dependency is unreachable
+        return {
+            "status": "unreachable",
+            "error": str(e),
+            "timestamp": time.time()
+        }
+
 
 class HealthCheck:
     """Health check functionality for Cerebritron services."""
@@ -27,13 +100,17 @@ class HealthCheck:
         self._service_name = service_name
         self._component_status_callback = component_status_callback
         self._dependencies = {}
-        self._lock = threading.RLock()
+        self._cache_ttl = 1.0
+        self._last_check_time = 0.0
+        self._check_lock = threading.Lock()
+        self._lock = RLock()
         self._health_data = {
             "status": "initializing",
             "components": {},
             "dependencies": {},
             "timestamp": time.time()
         }
+        self._publish_snapshot()
         self._logger = setup_logging(__name__)
     
     def add_dependency(self, name: str, url: str) -> None:
@@ -56,44 +133,56 @@ class HealthCheck:
             if name in self._dependencies:
                 del self._dependencies[name]
     
-    def check_health(self) -> Dict[str, Any]:
+    def check_health(self) -> Mapping[str, Any]:
+        """Check health of the service and its dependencies.
+        
+        Results are reused for a short time, so frequent health requests do
+        not probe the dependencies every time.
+        
+        Returns:
+            Read-only health status data, use to_dict() to serialize it
+        """
+        # Concurrent callers wait for a single check instead of each running one
+        with self._check_lock:
+            if time.monotonic() - self._last_check_time < self._cache_ttl:
+                return self._health_snapshot
+            
+            return self._check_health()
+    
+    def _check_health(self) -> Mapping[str, Any]:
         """Check health of the service and its dependencies.
         
         Returns:
             Health status data
         """
         with self._lock:
-            # Get component status
-            if self._component_status_callback:
-                self._health_data["components"] = self._component_status_callback()
+            dependencies = list(self._dependencies.items())
+        
+        # Check dependencies concurrently
+        futures = {name: _HTTP_POOL.submit(_check_dependency, url) for name, url in dependencies}
+        
+        # Get component status while the checks are running
+        components = self._component_status_callback() if self._component_status_callback else None
+        
+        done, _ = wait(futures.values(), timeout=_CHECK_TIMEOUT)
+        
+        with self._lock:
+            if components is not None:
+                self._health_data["components"] = components
             
-            # Check dependencies
-            for name, url in self._dependencies.items():
-                try:
-                    # Make health check request
-                    response = requests.get(f"{url}/health", timeout=5.0)
-                    
-                    # Parse response
-                    if response.status_code == 200:
-                        health_data = response.json()
-                        
-                        # Update dependency health data
-                        self._health_data["dependencies"][name] = {
-                            "status": health_data.get("status", "unknown"),
-                            "timestamp": time.time()
-                        }
-                    else:
-                        # Dependency is unhealthy
-                        self._health_data["dependencies"][name] = {
-                            "status": "unhealthy",
-                            "error": f"Health check failed with status code {response.status_code}",
-                            "timestamp": time.time()
-                        }
-                except Exception as e:
-                    # Dependency is unreachable
+            for name, future in futures.items():
+                # Skip dependencies removed during the check
+                if name not in self._dependencies:
+                    continue
+                
+                if future in done:
+                    self._health_data["dependencies"][name] = future.result()
+                else:
+                    # Dependency did not answer in time
+                    future.cancel()
                     self._health_data["dependencies"][name] = {
                         "status": "unreachable",
-                        "error": str(e),
+                        "error": "Health check timed out",
                         "timestamp": time.time()
                     }
             
@@ -107,17 +196,29 @@ class HealthCheck:
             
             # Update timestamp
             self._health_data["timestamp"] = time.time()
+            self._last_check_time = time.monotonic()
+            self._publish_snapshot()
             
-            return self._health_data.copy()
+            return self._health_snapshot
     
-    def get_health(self) -> Dict[str, Any]:
+    def get_health(self) -> Mapping[str, Any]:
         """Get the current health status.
         
+        The snapshot is replaced as a whole on every change, so it can be read
+        without the lock.
+        
         Returns:
-            Health status data
+            Read-only health status data, use to_dict() to serialize it
         """
-        with self._lock:
-            return self._health_data.copy()
+        return self._health_snapshot
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the current health status as plain dicts.
+        
+        Returns:
+            Mutable copy of the health status data, ready for serialization
+        """
+        return to_dict(self._health_snapshot)
     
     def set_status(self, status: str) -> None:
         """Set the overall status.
@@ -128,6 +229,7 @@ class HealthCheck:
         with self._lock:
             self._health_data["status"] = status
             self._health_data["timestamp"] = time.time()
+            self._publish_snapshot()
     
     def set_component_status(self, component: str, status: bool) -> None:
         """Set the status of a component.
@@ -139,3 +241,19 @@ class HealthCheck:
         with self._lock:
             self._health_data["components"][component] = status
             self._health_data["timestamp"] = time.time()
+            self._publish_snapshot()
+    
+    def _publish_snapshot(self) -> None:
+        """Publish a read-only snapshot of the health data.
+        
+        Must be called with the lock held.
+        """
+        self._health_snapshot = MappingProxyType({
+            "status": self._health_data["status"],
+            "components": MappingProxyType(dict(self._health_data["components"])),
+            "dependencies": MappingProxyType({
+                name: MappingProxyType(dependency)
+                for name, dependency in self._health_data["dependencies"].items()
+            }),
+            "timestamp": self._health_data["timestamp"]
+        })
@@ -4,35 +4,139 @@ Message Broker module for the Core functionality.
 This module provides publish-subscribe messaging between components.
 """
 
-import threading
-import time
+import asyncio
+import copy
 import json
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
 import re
-from typing import Any, Dict, Optional, Set, Callable, Pattern
+from typing import Any, Dict, List, Optional, Set, Callable, Pattern, Tuple
 
+import orjson
 import zmq
+import zmq.asyncio
+
+try:
+    from fastrlock.rlock import FastRLock as RLock
+except ImportError:
+    from threading import RLock
 
 from .logging import setup_logging
 
+# High-water mark for queued messages on the publisher and subscriber sockets
+_HWM = 100000
+
+# Maximum number of topics whose matching callbacks or encoded names are cached
+_TOPIC_CACHE_SIZE = 4096
+
+# Event loop shared by all brokers for receiving messages and running coroutine callbacks
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+# Run of digits that may be an integer outside the 64-bit range, which orjson
+# would turn into a float
+_LONG_NUMBER = re.compile(rb"\d{19}")
+
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """Get the event loop shared by all brokers, starting it on first use.
+    
+    Returns:
+        Running event loop
+    """
+    global _loop, _loop_thread
+    
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(
+                target=_loop.run_forever,
+                daemon=True,
+                name="message-broker"
+            )
+            _loop_thread.start()
+        
+        return _loop
+
+
+def _on_loop_thread() -> bool:
+    """Check whether the caller runs on the shared event loop.
+    
+    Returns:
+        True if called from the event loop thread, False otherwise
+    """
+    return threading.current_thread() is _loop_thread
+
+
+def _dumps(message: Dict[str, Any]) -> bytes:
+    """Serialize a message to JSON.
+    
+    Messages orjson rejects, like ones with integers outside the 64-bit range,
+    are serialized with the stdlib instead. orjson writes NaN and infinities as
+    null.
+    
+    Args:
+        message: Message to serialize
+        
+    Returns:
+        JSON document
+    """
+    try:
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        return json.dumps(message).encode()
+
+
+def _loads(data: bytes) -> Dict[str, Any]:
+    """Parse a received message.
+    
+    Messages that may hold integers orjson can't represent exactly, or that
+    orjson rejects, are parsed with the stdlib instead.
+    
+    Args:
+        data: JSON document
+        
+    Returns:
+        Parsed message
+    """
+    if not _LONG_NUMBER.search(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    
+    return json.loads(data)
+
 
 class MessageBroker:
     """Provides publish-subscribe messaging between components."""
     
-    def __init__(self, host: str = "127.0.0.1", port: int = 5555):
+    def __init__(self, host: str = "127.0.0.1", port: int = 5555, cross_process: bool = True):
         """Initialize the message broker.
         
         Args:
             host: Host to bind to
             port: Port to bind to
+            cross_process: Route messages through ZeroMQ so that other processes
+                can subscribe (optional, pass False to deliver messages to local
+                subscribers directly, without binding the port or serializing)
         """
         self._host = host
         self._port = port
+        self._cross_process = cross_process
         self._context = None
         self._socket = None
+        self._loop = None
+        self._executor = None
+        self._topic_bytes = {}
         self._subscribers = {}
-        self._subscriber_thread = None
-        self._stop_subscriber = threading.Event()
-        self._lock = threading.RLock()
+        self._subs_snapshot = ({}, None, (), OrderedDict())
+        self._writer_lock = threading.Lock()
+        self._subscriber_task = None
+        self._callback_tasks = set()
+        self._lock = RLock()
         self._initialized = False
         self._logger = setup_logging(__name__)
     
@@ -49,27 +153,44 @@ class MessageBroker:
             try:
                 self._logger.info("Initializing message broker")
                 
-                # Initialize ZeroMQ context
-                self._context = zmq.Context()
+                # Messages are received on the shared event loop and dispatched
+                # in order on a worker thread of this broker, so slow callbacks
+                # don't hold up other brokers
+                self._loop = _get_event_loop()
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="message-broker-dispatch")
                 
-                # Create publisher socket
-                self._socket = self._context.socket(zmq.PUB)
-                self._socket.bind(f"tcp://{self._host}:{self._port}")
-                
-                # Start subscriber thread
-                self._stop_subscriber.clear()
-                self._subscriber_thread = threading.Thread(
-                    target=self._subscriber_loop,
-                    daemon=True,
-                    name="message-broker"
-                )
-                self._subscriber_thread.start()
+                if self._cross_process:
+                    # Initialize ZeroMQ context
+                    self._context = zmq.Context()
+                    
+                    # Create publisher socket
+                    self._socket = self._context.socket(zmq.PUB)
+                    self._socket.setsockopt(zmq.SNDHWM, _HWM)
+                    self._socket.bind(f"tcp://{self._host}:{self._port}")
+                    
+                    # Start subscriber task, the event loop can't wait on itself
+                    if _on_loop_thread():
+                        self._subscriber_task = self._loop.create_task(self._subscriber_loop())
+                    else:
+                        future = asyncio.run_coroutine_threadsafe(self._start_subscriber(), self._loop)
+                        try:
+                            future.result(timeout=5.0)
+                        except Exception:
+                            future.cancel()
+                            raise
                 
                 self._initialized = True
                 self._logger.info("Message broker initialized successfully")
                 return True
             except Exception as e:
-                self._logger.error(f"Error initializing message broker: {e}")
+                self._logger.error("Error initializing message broker: %s", e)
+                
+                # Don't leave the port bound or the context open
+                try:
+                    self._close()
+                except Exception as e:
+                    self._logger.error("Error cleaning up message broker: %s", e)
+                
                 return False
     
     def shutdown(self) -> bool:
@@ -85,27 +206,13 @@ class MessageBroker:
             try:
                 self._logger.info("Shutting down message broker")
                 
-                # Stop subscriber thread
-                self._stop_subscriber.set()
-                if self._subscriber_thread:
-                    self._subscriber_thread.join(timeout=5.0)
-                    self._subscriber_thread = None
-                
-                # Close socket
-                if self._socket:
-                    self._socket.close()
-                    self._socket = None
-                
-                # Terminate context
-                if self._context:
-                    self._context.term()
-                    self._context = None
+                self._close()
                 
                 self._initialized = False
                 self._logger.info("Message broker shutdown successfully")
                 return True
             except Exception as e:
-                self._logger.error(f"Error shutting down message broker: {e}")
+                self._logger.error("Error shutting down message broker: %s", e)
                 return False
     
     def publish(self, topic: str, message: Dict[str, Any]) -> bool:
@@ -126,15 +233,59 @@ class MessageBroker:
             # Add topic to message
             message["_topic"] = topic
             
+            if not self._cross_process:
+                # Hand message to local subscribers without serializing it
+                self._publish_local(topic, message)
+                return True
+            
             # Convert message to JSON
-            message_json = json.dumps(message)
+            message_json = _dumps(message)
             
             # Publish message
-            self._socket.send_multipart([topic.encode(), message_json.encode()])
+            with self._lock:
+                self._socket.send_multipart([self._encode_topic(topic), message_json], flags=zmq.NOBLOCK)
             
             return True
         except Exception as e:
-            self._logger.error(f"Error publishing message: {e}")
+            self._logger.error("Error publishing message: %s", e)
+            return False
+    
+    def publish_many(self, messages: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """Publish several messages in one pass.
+        
+        Args:
+            messages: Pairs of topic and message to publish
+            
+        Returns:
+            True if publishing was successful, False otherwise
+        """
+        if not self._initialized:
+            self._logger.error("Message broker not initialized")
+            return False
+        
+        try:
+            # Format all frames before touching the socket
+            frames = []
+            for topic, message in messages:
+                # Add topic to message
+                message["_topic"] = topic
+                
+                if not self._cross_process:
+                    # Hand message to local subscribers without serializing it
+                    self._publish_local(topic, message)
+                    continue
+                
+                # Convert message to JSON
+                frames.append([self._encode_topic(topic), _dumps(message)])
+            
+            # Publish messages
+            with self._lock:
+                for frame in frames:
+                    self._socket.send_multipart(frame, flags=zmq.NOBLOCK)
+            
+            return True
+        except Exception as e:
+            self._logger.error("Error publishing messages: %s", e)
             return False
     
     def subscribe(self, topic_pattern: str, callback: Callable[[Dict[str, Any]], None]) -> bool:
@@ -142,16 +293,20 @@ class MessageBroker:
         
         Args:
             topic_pattern: Pattern to match topics against (supports wildcards with +)
-            callback: Function to call when a message is received
+            callback: Function to call when a message is received (called in
+                order on the broker dispatch thread, coroutine functions are
+                run as tasks on the broker event loop)
             
         Returns:
             True if subscription was successful, False otherwise
         """
-        with self._lock:
+        with self._writer_lock:
             try:
-                # Convert pattern to regex
-                regex_pattern = topic_pattern.replace("+", "[^.]+")
-                regex = re.compile(f"^{regex_pattern}$")
+                # Convert wildcard pattern to regex, literal topics are matched directly
+                regex = None
+                if "+" in topic_pattern:
+                    regex_pattern = "[^.]+".join(re.escape(part) for part in topic_pattern.split("+"))
+                    regex = re.compile(f"^{regex_pattern}$")
                 
                 # Add subscriber
                 if topic_pattern not in self._subscribers:
@@ -162,10 +317,13 @@ class MessageBroker:
                 
                 self._subscribers[topic_pattern]["callbacks"].add(callback)
                 
-                self._logger.info(f"Subscribed to topic pattern: {topic_pattern}")
+                # Publish new snapshot for the dispatcher
+                self._publish_snapshot()
+                
+                self._logger.info("Subscribed to topic pattern: %s", topic_pattern)
                 return True
             except Exception as e:
-                self._logger.error(f"Error subscribing to topic pattern: {e}")
+                self._logger.error("Error subscribing to topic pattern: %s", e)
                 return False
     
     def unsubscribe(self, topic_pattern: str, callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> bool:
@@ -178,7 +336,7 @@ class MessageBroker:
         Returns:
             True if unsubscription was successful, False otherwise
         """
-        with self._lock:
+        with self._writer_lock:
             try:
                 # Check if pattern exists
                 if topic_pattern not in self._subscribers:
@@ -194,66 +352,225 @@ class MessageBroker:
                 else:
                     del self._subscribers[topic_pattern]
                 
-                self._logger.info(f"Unsubscribed from topic pattern: {topic_pattern}")
+                # Publish new snapshot for the dispatcher
+                self._publish_snapshot()
+                
+                self._logger.info("Unsubscribed from topic pattern: %s", topic_pattern)
                 return True
             except Exception as e:
-                self._logger.error(f"Error unsubscribing from topic pattern: {e}")
+                self._logger.error("Error unsubscribing from topic pattern: %s", e)
                 return False
     
-    def _subscriber_loop(self) -> None:
+    def _close(self) -> None:
+        """Stop dispatching and close the sockets and the context.
+        
+        Must be called with the lock held. When called from the event loop
+        thread, for example by a coroutine callback, the subscriber task and
+        the context are cleaned up once the caller yields to the loop.
+        """
+        task, self._subscriber_task = self._subscriber_task, None
+        socket, self._socket = self._socket, None
+        context, self._context = self._context, None
+        
+        # Close publisher socket
+        if socket:
+            socket.close()
+        
+        # Stop subscriber task, then terminate the context once its socket is closed
+        if task or context:
+            stop = self._stop_subscriber(task, context)
+            if _on_loop_thread():
+                if task:
+                    task.cancel()
+                self._loop.create_task(stop)
+            else:
+                asyncio.run_coroutine_threadsafe(stop, self._loop).result(timeout=5.0)
+        
+        # Stop dispatching, callbacks that are still queued are dropped
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def _encode_topic(self, topic: str) -> bytes:
+        """Encode a topic for sending.
+        
+        Args:
+            topic: Topic to encode
+            
+        Returns:
+            Encoded topic
+        """
+        topic_bytes = self._topic_bytes.get(topic)
+        if topic_bytes is None:
+            topic_bytes = topic.encode()
+            
+            # Stop caching once the topic vocabulary turns out to be large
+            if len(self._topic_bytes) < _TOPIC_CACHE_SIZE:
+                self._topic_bytes[topic] = topic_bytes
+        
+        return topic_bytes
+    
+    def _publish_local(self, topic: str, message: Dict[str, Any]) -> None:
+        """Queue a message for dispatch to local subscribers.
+        
+        The message is copied so later changes to its top-level keys are not
+        seen by subscribers. Nested values are shared with the publisher.
+        
+        Args:
+            topic: Topic of the message
+            message: Message to dispatch
+        """
+        # Nobody can receive the message
+        literals, combined, _, _ = self._subs_snapshot
+        if not literals and combined is None:
+            return
+        
+        self._executor.submit(self._dispatch_message, topic, copy.copy(message))
+    
+    async def _start_subscriber(self) -> None:
+        """Start the subscriber task on the event loop."""
+        self._subscriber_task = asyncio.create_task(self._subscriber_loop())
+    
+    async def _stop_subscriber(self, task: Optional[asyncio.Task], context: Optional[zmq.Context]) -> None:
+        """Cancel the subscriber task and terminate the context once its socket is closed.
+        
+        Args:
+            task: Subscriber task (optional)
+            context: ZeroMQ context (optional)
+        """
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        
+        # Terminating waits for queued messages to be sent, keep the loop running meanwhile
+        if context:
+            await self._loop.run_in_executor(None, context.term)
+    
+    async def _subscriber_loop(self) -> None:
         """Receive and dispatch messages."""
         self._logger.info("Starting subscriber loop")
         
         # Create subscriber socket
-        subscriber = self._context.socket(zmq.SUB)
+        subscriber = zmq.asyncio.Context.shadow(self._context).socket(zmq.SUB)
+        subscriber.setsockopt(zmq.RCVHWM, _HWM)
         subscriber.connect(f"tcp://{self._host}:{self._port}")
         subscriber.setsockopt_string(zmq.SUBSCRIBE, "")
         
-        # Set up poller
-        poller = zmq.Poller()
-        poller.register(subscriber, zmq.POLLIN)
-        
-        while not self._stop_subscriber.is_set():
-            try:
-                # Poll for messages with timeout
-                socks = dict(poller.poll(timeout=100))
-                
-                if subscriber in socks and socks[subscriber] == zmq.POLLIN:
-                    # Receive message
-                    topic, message_json = subscriber.recv_multipart()
+        try:
+            while True:
+                try:
+                    # Receive message, queued messages are returned without waiting
+                    topic, message_json = await subscriber.recv_multipart()
                     topic = topic.decode()
                     
                     # Parse message
-                    message = json.loads(message_json.decode())
+                    message = _loads(message_json)
                     
                     # Dispatch message
-                    self._dispatch_message(topic, message)
-            except Exception as e:
-                self._logger.error(f"Error in subscriber loop: {e}")
-                # Sleep for a bit before retrying
-                time.sleep(0.1)
+                    self._executor.submit(self._dispatch_message, topic, message)
+                except Exception as e:
+                    self._logger.error("Error in subscriber loop: %s", e)
+                    # Sleep for a bit before retrying
+                    await asyncio.sleep(0.1)
+        finally:
+            # Clean up
+            subscriber.close(linger=0)
+            
+            self._logger.info("Subscriber loop stopped")
+    
+    def _publish_snapshot(self) -> None:
+        """Publish an immutable snapshot of the subscribers.
         
-        # Clean up
-        subscriber.close()
+        Must be called with the writer lock held. Literal topics are kept in
+        a dict for direct lookup. Wildcard patterns are folded into a single
+        regex with one optional lookahead per pattern, so a single match call
+        reports every pattern the topic satisfies. The snapshot is replaced
+        with a single attribute assignment, so the dispatcher can read it
+        without taking any lock. Each snapshot starts with an empty topic
+        cache, which invalidates cached matches.
+        """
+        literals = {}
+        parts = []
+        entries = []
+        for topic_pattern, subscriber in self._subscribers.items():
+            callbacks = frozenset(subscriber["callbacks"])
+            
+            if subscriber["regex"] is None:
+                literals[topic_pattern] = callbacks
+            else:
+                name = f"_sub{len(entries)}"
+                parts.append(f"(?:(?=(?P<{name}>{subscriber['regex'].pattern})))?")
+                entries.append((name, callbacks))
         
-        self._logger.info("Subscriber loop stopped")
+        combined = re.compile("".join(parts)) if parts else None
+        self._subs_snapshot = (literals, combined, tuple(entries), OrderedDict())
+    
+    def _match_topic(self, topic: str) -> Tuple[Callable[[Dict[str, Any]], None], ...]:
+        """Find the callbacks of all patterns matching a topic.
+        
+        Results are cached per topic, least recently used topics are evicted
+        first. Only called from the broker dispatch thread.
+        
+        Args:
+            topic: Topic to match
+            
+        Returns:
+            Callbacks to call for the topic
+        """
+        literals, combined, entries, cache = self._subs_snapshot
+        if combined is None:
+            # Only literal topics, a cache would not be any faster
+            return literals.get(topic, ())
+        
+        callbacks = cache.get(topic)
+        if callbacks is not None:
+            cache.move_to_end(topic)
+            return callbacks
+        
+        # Find matching literal topic and wildcard patterns
+        matched = combined.match(topic).groupdict()
+        callbacks = tuple(literals.get(topic, ())) + tuple(
+            callback
+            for name, pattern_callbacks in entries
+            if matched[name] is not None
+            for callback in pattern_callbacks
+        )
+        
+        cache[topic] = callbacks
+        if len(cache) > _TOPIC_CACHE_SIZE:
+            cache.popitem(last=False)
+        
+        return callbacks
     
     def _dispatch_message(self, topic: str, message: Dict[str, Any]) -> None:
         """Dispatch a message to subscribers.
         
+        Runs on the broker dispatch thread.
+        
         Args:
             topic: Topic of the message
             message: Message to dispatch
         """
-        with self._lock:
-            # Find matching patterns
-            for pattern, subscriber in self._subscribers.items():
-                regex = subscriber["regex"]
+        # Call callbacks
+        for callback in self._match_topic(topic):
+            try:
+                result = callback(message)
                 
-                if regex.match(topic):
-                    # Call callbacks
-                    for callback in list(subscriber["callbacks"]):
-                        try:
-                            callback(message)
-                        except Exception as e:
-                            self._logger.error(f"Error in subscriber callback: {e}")
+                # Run coroutine callbacks as tasks on the event loop
+                if asyncio.iscoroutine(result):
+                    future = asyncio.run_coroutine_threadsafe(result, self._loop)
+                    self._callback_tasks.add(future)
+                    future.add_done_callback(self._callback_done)
+            except Exception as e:
+                self._logger.error("Error in subscriber callback: %s", e)
+    
+    def _callback_done(self, future: Future) -> None:
+        """Release a finished coroutine callback and log its error.
+        
+        Args:
+            future: Future of the finished callback
+        """
+        self._callback_tasks.discard(future)
+        
+        if not future.cancelled() and future.exception() is not None:
+            self._logger.error("Error in subscriber callback: %s", future.exception())
@@ -4,13 +4,80 @@ REST Client module for the Core functionality.
 This module provides a client for making REST API requests.
 """
 
+import asyncio
+import json
+import re
 import threading
-from typing import Any, Dict, Optional
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
-import requests
+import httpx
+import orjson
 
 from .logging import setup_logging
 
+# Connection pool limits for the REST client
+_LIMITS = httpx.Limits(max_keepalive_connections=64, max_connections=128)
+
+# Timeout for REST client requests
+_TIMEOUT = httpx.Timeout(10.0)
+
+# Content types whose bodies are parsed as JSON
+_JSON_PREFIXES = ("application/json", "application/problem+json")
+
+# Run of digits that may be an integer outside the 64-bit range, which orjson
+# would turn into a float
+_LONG_NUMBER = re.compile(rb"\d{19}")
+
+# Maximum number of batch calls in flight at once
+_BATCH_WORKERS = 32
+
+# A call in a batch. payload is sent as query parameters for GET and as a JSON
+# body otherwise. input_from names the call whose result feeds this one: a
+# callable payload is called with that result, a dict payload is merged with
+# it, which requires the result to be a JSON object.
+BatchCall = namedtuple("BatchCall", "call_id method url payload input_from", defaults=(None, None))
+
+
+def _drop_none(values: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Drop None-valued entries from query parameters or form data.
+    
+    Args:
+        values: Parameters to clean (optional)
+        
+    Returns:
+        Parameters without None values, matching how requests encodes them
+    """
+    if not values:
+        return values
+    
+    return {key: value for key, value in values.items() if value is not None}
+
+
+def _parse_response(response: httpx.Response) -> Dict[str, Any]:
+    """Convert a response to response data.
+    
+    Args:
+        response: Response to convert
+        
+    Returns:
+        Parsed JSON body, or the text and status code for other content types
+    """
+    # Check if response is JSON
+    content_type = response.headers.get("content-type")
+    if content_type and content_type.startswith(_JSON_PREFIXES):
+        content = response.content
+        if not _LONG_NUMBER.search(content):
+            try:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
+                # Let the stdlib parse what orjson rejects, such as NaN, or raise
+                pass
+        return json.loads(content)
+    else:
+        return {"text": response.text, "status_code": response.status_code}
+
 
 class RestClient:
     """Client for making REST API requests."""
@@ -21,9 +88,12 @@ class RestClient:
         Args:
             base_url: Base URL for requests (optional)
         """
-        self._base_url = base_url
+        # Parse base URL once, both sessions join request URLs onto it
+        self._base_url = httpx.URL(base_url or "")
         self._session = None
-        self._lock = threading.RLock()
+        self._aclients = {}  # event loop -> async session
+        self._alock = threading.Lock()
+        self._lock = threading.Lock()
         self._initialized = False
         self._logger = setup_logging(__name__)
     
@@ -40,14 +110,19 @@ class RestClient:
             try:
                 self._logger.info("Initializing REST client")
                 
-                # Create session
-                self._session = requests.Session()
+                # Create session, HTTP/2 lets concurrent requests share a connection
+                self._session = httpx.Client(
+                    base_url=self._base_url,
+                    timeout=_TIMEOUT,
+                    follow_redirects=True,
+                    transport=httpx.HTTPTransport(http2=True, limits=_LIMITS, retries=3)
+                )
                 
                 self._initialized = True
                 self._logger.info("REST client initialized successfully")
                 return True
             except Exception as e:
-                self._logger.error(f"Error initializing REST client: {e}")
+                self._logger.error("Error initializing REST client: %s", e)
                 return False
     
     def shutdown(self) -> bool:
@@ -68,11 +143,22 @@ class RestClient:
                     self._session.close()
                     self._session = None
                 
+                # Close async sessions on the event loops they were created on
+                with self._alock:
+                    aclients = list(self._aclients.items())
+                    self._aclients.clear()
+                
+                for loop, aclient in aclients:
+                    if loop.is_running():
+                        asyncio.run_coroutine_threadsafe(aclient.aclose(), loop)
+                    elif not loop.is_closed():
+                        loop.run_until_complete(aclient.aclose())
+                
                 self._initialized = False
                 self._logger.info("REST client shutdown successfully")
                 return True
             except Exception as e:
-                self._logger.error(f"Error shutting down REST client: {e}")
+                self._logger.error("Error shutting down REST client: %s", e)
                 return False
     
     def get(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
@@ -91,21 +177,12 @@ class RestClient:
             return {"error": "REST client not initialized"}
         
         try:
-            # Build URL
-            full_url = url
-            if self._base_url and not url.startswith(("http://", "https://")):
-                full_url = f"{self._base_url.rstrip('/')}/{url.lstrip('/')}"
-            
-            # Make request
-            response = self._session.get(full_url, params=params, headers=headers)
+            # Make request, relative URLs are resolved against the base URL
+            response = self._session.get(url, params=_drop_none(params), headers=headers)
             
-            # Check if response is JSON
-            if response.headers.get("Content-Type", "").startswith("application/json"):
-                return response.json()
-            else:
-                return {"text": response.text, "status_code": response.status_code}
+            return _parse_response(response)
         except Exception as e:
-            self._logger.error(f"Error making GET request: {e}")
+            self._logger.error("Error making GET request: %s", e)
             return {"error": str(e)}
     
     def post(self, url: str, data: Optional[Dict[str, Any]] = None, json_data: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
@@ -125,19 +202,206 @@ class RestClient:
             return {"error": "REST client not initialized"}
         
         try:
-            # Build URL
-            full_url = url
-            if self._base_url and not url.startswith(("http://", "https://")):
-                full_url = f"{self._base_url.rstrip('/')}/{url.lstrip('/')}"
+            # Make request, relative URLs are resolved against the base URL
+            response = self._session.post(url, data=_drop_none(data), json=json_data, headers=headers)
             
-            # Make request
-            response = self._session.post(full_url, data=data, json=json_data, headers=headers)
+            return _parse_response(response)
+        except Exception as e:
+            self._logger.error("Error making POST request: %s", e)
+            return {"error": str(e)}
+    
+    async def aget(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Make a GET request without blocking the event loop.
+        
+        Args:
+            url: URL to request
+            params: Query parameters (optional)
+            headers: Request headers (optional)
             
-            # Check if response is JSON
-            if response.headers.get("Content-Type", "").startswith("application/json"):
-                return response.json()
-            else:
-                return {"text": response.text, "status_code": response.status_code}
+        Returns:
+            Response data
+        """
+        if not self._initialized:
+            self._logger.error("REST client not initialized")
+            return {"error": "REST client not initialized"}
+        
+        try:
+            # Make request, relative URLs are resolved against the base URL
+            client = self._get_async_client()
+            response = await client.get(url, params=_drop_none(params), headers=headers)
+            
+            return _parse_response(response)
+        except Exception as e:
+            self._logger.error("Error making async GET request: %s", e)
+            return {"error": str(e)}
+    
+    async def apost(self, url: str, data: Optional[Dict[str, Any]] = None, json_data: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Make a POST request without blocking the event loop.
+        
+        Args:
+            url: URL to request
+            data: Form data (optional)
+            json_data: JSON data (optional)
+            headers: Request headers (optional)
+            
+        Returns:
+            Response data
+        """
+        if not self._initialized:
+            self._logger.error("REST client not initialized")
+            return {"error": "REST client not initialized"}
+        
+        try:
+            # Make request, relative URLs are resolved against the base URL
+            client = self._get_async_client()
+            response = await client.post(url, data=_drop_none(data), json=json_data, headers=headers)
+            
+            return _parse_response(response)
         except Exception as e:
-            self._logger.error(f"Error making POST request: {e}")
+            self._logger.error("Error making async POST request: %s", e)
             return {"error": str(e)}
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Get the async session of the running event loop, creating it on first use.
+        
+        Connections of an async session belong to the event loop that opened
+        them, so each event loop gets its own session.
+        
+        Returns:
+            Async session bound to the running event loop
+        """
+        loop = asyncio.get_running_loop()
+        aclient = self._aclients.get(loop)
+        if aclient is None:
+            with self._alock:
+                aclient = self._aclients.get(loop)
+                if aclient is None:
+                    # Drop sessions of event loops that have been closed
+                    for closed_loop in [other for other in self._aclients if other.is_closed()]:
+                        del self._aclients[closed_loop]
+                    
+                    aclient = httpx.AsyncClient(
+                        base_url=self._base_url,
+                        timeout=_TIMEOUT,
+                        follow_redirects=True,
+                        transport=httpx.AsyncHTTPTransport(http2=True, limits=_LIMITS, retries=3)
+                    )
+                    self._aclients[loop] = aclient
+        
+        return aclient
+    
+    def batch(self, calls: List[BatchCall]) -> Dict[str, Dict[str, Any]]:
+        """Make several requests, running independent ones concurrently.
+        
+        Calls are grouped into layers by their input_from dependencies. All
+        calls of a layer run concurrently, and each layer starts once the
+        results it depends on are available, so a chain of N calls takes N
+        round trips while independent calls share one. A call fails if it
+        raises or gets a non-2xx response, and its result is then an error
+        with the status code and response data. Calls whose input failed,
+        names a call that is not in the batch, or can't be turned into a
+        payload are not sent and get an INVALID_ARGUMENT error.
+        
+        Args:
+            calls: Calls to make
+            
+        Returns:
+            Response data by call ID
+        """
+        if not self._initialized:
+            self._logger.error("REST client not initialized")
+            return {call.call_id: {"error": "REST client not initialized"} for call in calls}
+        
+        results = {}
+        failed = set()
+        pending = list(calls)
+        
+        with ThreadPoolExecutor(max_workers=min(max(len(calls), 1), _BATCH_WORKERS)) as pool:
+            while pending:
+                # Find calls whose input is available
+                layer = [call for call in pending if call.input_from is None or call.input_from in results]
+                if not layer:
+                    # Remaining calls depend on unknown calls or on each other
+                    for call in pending:
+                        results[call.call_id] = {"error": f"INVALID_ARGUMENT: input {call.input_from} is not available"}
+                        failed.add(call.call_id)
+                    break
+                
+                pending = [call for call in pending if call.input_from is not None and call.input_from not in results]
+                
+                # Build payloads, skipping calls whose input failed
+                runnable = []
+                for call in layer:
+                    payload = call.payload
+                    if call.input_from is not None:
+                        if call.input_from in failed:
+                            results[call.call_id] = {"error": f"INVALID_ARGUMENT: input {call.input_from} failed"}
+                            failed.add(call.call_id)
+                            continue
+                        
+                        try:
+                            payload = self._build_batch_payload(call, results[call.input_from])
+                        except Exception as e:
+                            self._logger.error("Error building payload of batch call %s: %s", call.call_id, e)
+                            results[call.call_id] = {"error": f"INVALID_ARGUMENT: {e}"}
+                            failed.add(call.call_id)
+                            continue
+                    
+                    runnable.append((call, payload))
+                
+                # Run layer
+                for (call, _), (result, succeeded) in zip(runnable, pool.map(lambda item: self._send_batch_call(*item), runnable)):
+                    results[call.call_id] = result
+                    if not succeeded:
+                        failed.add(call.call_id)
+        
+        return results
+    
+    def _build_batch_payload(self, call: BatchCall, result: Any) -> Any:
+        """Build the payload of a batch call from the result of its input.
+        
+        Args:
+            call: Call to build the payload for
+            result: Result of the call named by input_from
+            
+        Returns:
+            Payload for the call
+        """
+        if callable(call.payload):
+            return call.payload(result)
+        
+        # Only JSON objects can be merged into a dict payload
+        if not isinstance(result, Mapping):
+            raise ValueError(f"input {call.input_from} returned {type(result).__name__}, not an object")
+        if call.payload is not None and not isinstance(call.payload, Mapping):
+            raise ValueError(f"payload is {type(call.payload).__name__}, not a dict")
+        
+        return {**(call.payload or {}), **result}
+    
+    def _send_batch_call(self, call: BatchCall, payload: Any) -> Tuple[Any, bool]:
+        """Make the request of a batch call.
+        
+        Args:
+            call: Call to make
+            payload: Payload for the call
+            
+        Returns:
+            Response data, and whether the call succeeded
+        """
+        try:
+            method = call.method.upper()
+            
+            # Make request, relative URLs are resolved against the base URL
+            if method == "GET":
+                response = self._session.request(method, call.url, params=_drop_none(payload))
+            else:
+                response = self._session.request(method, call.url, json=payload)
+            
+            data = _parse_response(response)
+            if not response.is_success:
+                return {"error": f"HTTP {response.status_code}", "status_code": response.status_code, "response": data}, False
+            
+            return data, True
+        except Exception as e:
+            self._logger.error("Error making batch request %s: %s", call.call_id, e)
+            return {"error": str(e)}, False
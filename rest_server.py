@@ -4,33 +4,160 @@ REST Server module for the Core functionality.
 This module provides a server for hosting REST API endpoints.
 """
 
+import os
+import re
 import threading
-import time
 import json
-from typing import Any, Dict, Optional, List
+from typing import Any, Callable, Coroutine, Dict, Optional, List
 
 from fastapi import FastAPI, APIRouter, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import APIRoute, request_response
+import anyio.to_thread
+import orjson
 import uvicorn
 
 from .logging import setup_logging
 
+# Maximum time to wait for the server to start listening
+_STARTUP_TIMEOUT = 10.0
+
+# Number of threads for running sync endpoints, never below the anyio default of 40
+_THREAD_LIMIT = max(40, (os.cpu_count() or 1) * 8)
+
+# Run of digits that may be an integer outside the 64-bit range, which orjson
+# would turn into a float
+_LONG_NUMBER = re.compile(rb"\d{19}")
+
+# FastAPI deprecates ORJSONResponse once it serializes responses itself, keep
+# its default response class there
+if getattr(ORJSONResponse, "__deprecated__", None) is None:
+    class _ORJSONResponse(ORJSONResponse):
+        """Response that serializes with orjson, falling back to the stdlib.
+        
+        orjson rejects integers outside the 64-bit range, those responses are
+        rendered by JSONResponse as they would be without this class.
+        """
+        
+        def render(self, content: Any) -> bytes:
+            try:
+                return super().render(content)
+            except TypeError:
+                return JSONResponse.render(self, content)
+    
+    _RESPONSE_CLASS = _ORJSONResponse
+else:
+    _RESPONSE_CLASS = JSONResponse
+
+
+class ORJSONRoute(APIRoute):
+    """Route that parses JSON request bodies with orjson.
+    
+    Routes of the server app use this class, and plain APIRoute routes of
+    routers passed to add_router() are converted to it when mounted. Bodies
+    that may hold integers orjson can't represent exactly are left to the
+    stdlib parser, so parsed values are the same as without this route.
+    """
+    
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        """Get the route handler, parsing JSON bodies before FastAPI reads them.
+        
+        Returns:
+            Route handler
+        """
+        original_handler = super().get_route_handler()
+        
+        async def route_handler(request: Request) -> Response:
+            # FastAPI reuses the body that Request.json() has already parsed
+            if self.body_field is not None:
+                content_type = request.headers.get("content-type")
+                if content_type and content_type.startswith("application/json"):
+                    body = await request.body()
+                    if body and not _LONG_NUMBER.search(body):
+                        try:
+                            request._json = orjson.loads(body)
+                        except orjson.JSONDecodeError:
+                            # Leave bodies orjson rejects to FastAPI's own parsing and errors
+                            pass
+            
+            return await original_handler(request)
+        
+        return route_handler
+
+
+class _Server(uvicorn.Server):
+    """Uvicorn server that signals when it has started."""
+    
+    def __init__(self, config: uvicorn.Config, ready: threading.Event):
+        """Initialize the server.
+        
+        Args:
+            config: Server configuration
+            ready: Event to set once the server is listening
+        """
+        super().__init__(config)
+        self._ready = ready
+    
+    async def startup(self, sockets: Optional[List[Any]] = None) -> None:
+        """Start the server and signal that it is listening.
+        
+        Args:
+            sockets: Pre-bound sockets to serve on (optional)
+        """
+        # Size the thread pool for sync endpoints, the limiter is per event loop
+        anyio.to_thread.current_default_thread_limiter().total_tokens = _THREAD_LIMIT
+        
+        await super().startup(sockets=sockets)
+        self._ready.set()
+
+
+def _use_orjson_route(routes: List[Any]) -> None:
+    """Convert plain APIRoute routes, including those of nested routers, to ORJSONRoute.
+    
+    Args:
+        routes: Routes of a router, routes with a custom class are kept
+    """
+    for route in routes:
+        if type(route) is APIRoute:
+            route.__class__ = ORJSONRoute
+            route.app = request_response(route.get_route_handler())
+        elif hasattr(route, "original_router"):
+            # Router included into the router without copying its routes
+            _use_orjson_route(route.original_router.routes)
+
 
 class RestServer:
     """Server for providing REST API endpoints."""
     
-    def __init__(self, host: str = "0.0.0.0", port: int = 8000):
+    def __init__(self, host: str = "0.0.0.0", port: int = 8000, debug: bool = False):
         """Initialize the REST server.
         
         Args:
             host: Host to bind to
             port: Port to bind to
+            debug: Serve the OpenAPI schema and the interactive docs
         """
         self._host = host
         self._port = port
-        self._app = FastAPI(title="Cerebritron API")
+        self._debug = debug
+        
+        # Docs and schema are only served in debug mode
+        if debug:
+            self._app = FastAPI(title="Cerebritron API", default_response_class=_RESPONSE_CLASS)
+        else:
+            self._app = FastAPI(
+                title="Cerebritron API",
+                default_response_class=_RESPONSE_CLASS,
+                docs_url=None,
+                redoc_url=None,
+                openapi_url=None
+            )
+        self._app.router.route_class = ORJSONRoute
         self._server = None
         self._server_thread = None
-        self._lock = threading.RLock()
+        self._pending_routers = []
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
         self._initialized = False
         self._logger = setup_logging(__name__)
     
@@ -47,7 +174,11 @@ class RestServer:
             try:
                 self._logger.info("Initializing REST server")
                 
+                # Mount routers added so far
+                self._freeze()
+                
                 # Start server thread
+                self._ready.clear()
                 self._server_thread = threading.Thread(
                     target=self._run_server,
                     daemon=True,
@@ -55,14 +186,15 @@ class RestServer:
                 )
                 self._server_thread.start()
                 
-                # Wait for server to start
-                time.sleep(1.0)
+                # Wait for server to start listening, or to fail starting
+                if not self._ready.wait(timeout=_STARTUP_TIMEOUT) or not (self._server and self._server.started):
+                    raise RuntimeError("server failed to start")
                 
                 self._initialized = True
-                self._logger.info(f"REST server initialized successfully at http://{self._host}:{self._port}")
+                self._logger.info("REST server initialized successfully at http://%s:%s", self._host, self._port)
                 return True
             except Exception as e:
-                self._logger.error(f"Error initializing REST server: {e}")
+                self._logger.error("Error initializing REST server: %s", e)
                 return False
     
     def shutdown(self) -> bool:
@@ -92,21 +224,50 @@ class RestServer:
                 self._logger.info("REST server shutdown successfully")
                 return True
             except Exception as e:
-                self._logger.error(f"Error shutting down REST server: {e}")
+                self._logger.error("Error shutting down REST server: %s", e)
                 return False
     
     def add_router(self, router: APIRouter, prefix: str = "") -> None:
         """Add a router to the server.
         
+        The router is mounted by the next call to freeze(), or by initialize()
+        if the server is not running yet. Endpoints that block or are CPU-heavy
+        should be declared with def rather than async def, so that they run
+        in the thread pool instead of on the event loop.
+        
         Args:
             router: Router to add
             prefix: Prefix for router routes (optional)
         """
-        self._app.include_router(router, prefix=prefix)
+        with self._lock:
+            self._pending_routers.append((router, prefix))
+    
+    def freeze(self) -> None:
+        """Mount all added routers and, in debug mode, rebuild the OpenAPI schema once."""
+        with self._lock:
+            self._freeze()
+    
+    def _freeze(self) -> None:
+        """Mount all added routers, the caller must hold the lock."""
+        if not self._pending_routers:
+            return
+        
+        for router, prefix in self._pending_routers:
+            # Included routes keep the class of their router, convert them
+            # before including so that they parse bodies with orjson as well
+            _use_orjson_route(router.routes)
+            self._app.include_router(router, prefix=prefix)
+        
+        self._pending_routers.clear()
+        
+        # Drop the cached schema so that it covers the new routes
+        if self._debug:
+            self._app.openapi_schema = None
+            self._app.openapi()
     
     def _run_server(self) -> None:
         """Run the server."""
-        self._logger.info(f"Starting REST server on {self._host}:{self._port}")
+        self._logger.info("Starting REST server on %s:%s", self._host, self._port)
         
         try:
             # Create and run server
@@ -114,9 +275,20 @@ class RestServer:
                 app=self._app,
                 host=self._host,
                 port=self._port,
-                log_level="error"
+                log_level="error",
+                # Use uvloop and httptools when installed
+                loop="auto",
+                http="auto",
+                # Skip per-request work that the API doesn't need
+                access_log=False,
+                proxy_headers=False,
+                server_header=False,
+                date_header=False
             )
-            self._server = uvicorn.Server(config)
+            self._server = _Server(config, self._ready)
             self._server.run()
-        except Exception as e:
-            self._logger.error(f"Error running REST server: {e}")
+        except (Exception, SystemExit) as e:
+            self._logger.error("Error running REST server: %s", e)
+        finally:
+            # Don't keep initialize() waiting if startup failed
+            self._ready.set()
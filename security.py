@@ -6,12 +6,55 @@ encryption, decryption, and secure storage of sensitive information.
 """
 
 import base64
+import hashlib
+import hmac
 import os
 from typing import Any, Dict, Optional
 
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Token format: version (1 byte) + nonce (12 bytes) + AES-GCM ciphertext
+_TOKEN_VERSION = b'\x01'
+_NONCE_SIZE = 12
+_HEADER_SIZE = 1 + _NONCE_SIZE
+
+# Start of a Fernet token from older versions, the version byte 0x80 in urlsafe base64
+_FERNET_PREFIX = b"g"
+
+# scrypt cost parameters, memory use is 128 * n * r bytes (32 MiB)
+_SCRYPT_N = 2 ** 15
+_SCRYPT_R = 8
+_SCRYPT_P = 1
+_SCRYPT_MAXMEM = 64 * 1024 * 1024
+
+# Prefix of scrypt password hashes, hashes without it are PBKDF2
+_SCRYPT_PREFIX = "scrypt$"
+
+# PBKDF2 for verifying hashes made before the switch to scrypt
+_pbkdf2 = hashlib.pbkdf2_hmac
+
+
+def _scrypt(password: str, salt: bytes) -> bytes:
+    """Derive 32 bytes from a password with scrypt.
+    
+    Args:
+        password: Password to derive from
+        salt: Salt for derivation
+        
+    Returns:
+        Derived bytes
+    """
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt,
+        n=_SCRYPT_N,
+        r=_SCRYPT_R,
+        p=_SCRYPT_P,
+        maxmem=_SCRYPT_MAXMEM,
+        dklen=32
+    )
 
 
 class SecureStorage:
@@ -31,6 +74,10 @@ class SecureStorage:
         else:
             self._key = Fernet.generate_key()
         
+        # Keys are urlsafe base64 of 32 bytes, as made by Fernet.generate_key()
+        self._aead = AESGCM(base64.urlsafe_b64decode(self._key))
+        
+        # Kept for decrypting tokens from older versions
         self._cipher = Fernet(self._key)
     
     def encrypt(self, data: str) -> str:
@@ -42,8 +89,9 @@ class SecureStorage:
         Returns:
             Encrypted data as a base64-encoded string
         """
-        encrypted_data = self._cipher.encrypt(data.encode())
-        return base64.b64encode(encrypted_data).decode()
+        nonce = os.urandom(_NONCE_SIZE)
+        token = _TOKEN_VERSION + nonce + self._aead.encrypt(nonce, data.encode(), None)
+        return base64.urlsafe_b64encode(token).decode("ascii")
     
     def decrypt(self, encrypted_data: str) -> str:
         """Decrypt data.
@@ -54,8 +102,22 @@ class SecureStorage:
         Returns:
             Decrypted data
         """
-        decoded_data = base64.b64decode(encrypted_data)
-        decrypted_data = self._cipher.decrypt(decoded_data)
+        token = encrypted_data.encode("ascii")
+        
+        # Older versions encrypted with Fernet
+        if token.startswith(_FERNET_PREFIX):
+            return self._cipher.decrypt(token).decode()
+        
+        token = base64.urlsafe_b64decode(token)
+        if token[:1] == _TOKEN_VERSION:
+            try:
+                decrypted_data = self._aead.decrypt(token[1:_HEADER_SIZE], token[_HEADER_SIZE:], None)
+            except InvalidTag:
+                raise InvalidToken
+        else:
+            # Older versions base64-encoded the Fernet token a second time
+            decrypted_data = self._cipher.decrypt(token)
+        
         return decrypted_data.decode()
     
     def get_key(self) -> bytes:
@@ -79,14 +141,7 @@ class SecureStorage:
         if salt is None:
             salt = os.urandom(16)
         
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000
-        )
-        
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
+        key = base64.urlsafe_b64encode(_scrypt(password, salt))
         return key
 
 
@@ -99,24 +154,17 @@ def hash_password(password: str) -> str:
     Returns:
         Hashed password
     """
-    import hashlib
-    
     # Generate a random salt
     salt = os.urandom(32)
     
     # Hash the password with the salt
-    hash_obj = hashlib.pbkdf2_hmac(
-        'sha256',
-        password.encode(),
-        salt,
-        100000
-    )
+    hash_obj = _scrypt(password, salt)
     
     # Combine salt and hash
     storage = salt + hash_obj
     
-    # Return as a hex string
-    return storage.hex()
+    # Return as a prefixed hex string
+    return _SCRYPT_PREFIX + storage.hex()
 
 
 def verify_password(stored_password: str, provided_password: str) -> bool:
@@ -129,10 +177,13 @@ def verify_password(stored_password: str, provided_password: str) -> bool:
     Returns:
         True if the password is correct, False otherwise
     """
-    import hashlib
+    # Unprefixed hashes were made with PBKDF2 before the switch to scrypt
+    is_scrypt = stored_password.startswith(_SCRYPT_PREFIX)
+    if is_scrypt:
+        stored_password = stored_password[len(_SCRYPT_PREFIX):]
     
-    # Convert stored password from hex to bytes
-    storage = bytes.fromhex(stored_password)
+    # Convert stored password from hex to bytes, slices of the view don't copy
+    storage = memoryview(bytes.fromhex(stored_password))
     
     # Extract salt
     salt = storage[:32]
@@ -141,12 +192,15 @@ def verify_password(stored_password: str, provided_password: str) -> bool:
     stored_hash = storage[32:]
     
     # Hash the provided password with the same salt
-    hash_obj = hashlib.pbkdf2_hmac(
-        'sha256',
-        provided_password.encode(),
-        salt,
-        100000
-    )
+    if is_scrypt:
+        hash_obj = _scrypt(provided_password, salt)
+    else:
+        hash_obj = _pbkdf2(
+            'sha256',
+            provided_password.encode(),
+            salt,
+            100000
+        )
     
-    # Compare hashes
-    return hash_obj == stored_hash
+    # Compare hashes in constant time
+    return hmac.compare_digest(hash_obj, stored_hash)